@@ -1,13 +1,115 @@
 """Custom Sphinx extension to add multiple JupyterHub launch buttons."""
 
+import os
 from pathlib import Path
 from typing import Any, Optional
-from urllib.parse import urlencode
+from urllib.parse import quote_plus
 
 from docutils.nodes import document
 from sphinx.application import Sphinx
+from sphinx.config import Config
+from sphinx.environment import BuildEnvironment
+from sphinx.util.matching import Matcher
 from sphinx_book_theme.header_buttons import get_repo_url, get_repo_parts
 
+_LAUNCH_TYPES = frozenset(("dropdown", "group"))
+# Never searched for notebook sources, whatever exclude_patterns says
+_SKIP_DIRS = frozenset(("_build", ".ipynb_checkpoints"))
+
+
+def _index_notebooks(app: Sphinx):
+    """Record every document that has an .ipynb source, once per build.
+
+    This replaces a filesystem probe per page with a set lookup.
+    """
+    srcdir = Path(app.srcdir)
+    excluded = Matcher(app.config.exclude_patterns)
+    ipynb_set = set()
+    for dirpath, dirnames, filenames in os.walk(srcdir):
+        reldir = Path(dirpath).relative_to(srcdir)
+        # Prune build output, checkpoints and excluded trees in place
+        dirnames[:] = [
+            d for d in dirnames
+            if d not in _SKIP_DIRS and not excluded((reldir / d).as_posix())
+        ]
+        for filename in filenames:
+            if filename.endswith(".ipynb"):
+                relpath = (reldir / filename).as_posix()
+                if not excluded(relpath):
+                    ipynb_set.add(relpath[: -len(".ipynb")])
+    app.env._nd_ipynb_set = ipynb_set
+
+
+def _purge_notebook(app: Sphinx, env: BuildEnvironment, docname: str):
+    """Refresh the notebook index entry for a document that changed."""
+    ipynb_set = getattr(env, "_nd_ipynb_set", None)
+    if ipynb_set is None:
+        return
+    if Path(env.doc2path(docname)).with_suffix(".ipynb").exists():
+        ipynb_set.add(docname)
+    else:
+        ipynb_set.discard(docname)
+
+
+def _launch_buttons_config(config: Config) -> dict[str, Any]:
+    """Return the launch_buttons settings from the theme or top-level config."""
+    return (
+        (config.html_theme_options or {}).get("launch_buttons")
+        or getattr(config, "launch_buttons", None)
+        or {}
+    )
+
+
+def _build_jupyterhub_context(app: Sphinx):
+    """Precompute the page-independent parts of the JupyterHub buttons.
+
+    Config lookups and the static query-string parts are resolved once per
+    build; each page then only fills in the repository URL and its path.
+    """
+    config_theme = app.config["html_theme_options"]
+    launch_buttons = _launch_buttons_config(app.config)
+
+    servers = []
+    for server in launch_buttons.get("jupyterhub_servers", []):
+        server_url = server.get("url", "").strip("/")
+        server_text = server.get("text", "JupyterHub")
+        if server_url:
+            servers.append((server_url, server_text))
+
+    # Get the branch from config (fall back across common config locations)
+    repo_config = getattr(app.config, "repository", None) or {}
+    branch = (
+        repo_config.get("branch")
+        or config_theme.get("repository_branch")
+        or "main"
+    )
+
+    # Get the notebook interface preference
+    notebook_interface = launch_buttons.get("notebook_interface", "classic")
+    notebook_interface_prefixes = {"classic": "tree", "jupyterlab": "lab/tree"}
+    ui_pre = notebook_interface_prefixes.get(notebook_interface, "tree")
+
+    book_relpath = (
+        (config_theme.get("path_to_docs") or repo_config.get("path_to_book") or "")
+        .strip("/")
+    )
+    if book_relpath != "":
+        book_relpath += "/"
+
+    # Same encoding as urlencode(..., safe="/"); quoted values cannot
+    # contain braces, so the result is safe to use with str.format.
+    template = (
+        "{server}/hub/user-redirect/git-pull?repo={repo_url}"
+        f"&urlpath={quote_plus(ui_pre, safe='/')}/{{path}}"
+        f"&branch={quote_plus(branch, safe='/')}"
+    )
+
+    app.env._nd_jh_ctx = {
+        "servers": servers,
+        "book_relpath": book_relpath,
+        "template": template,
+    }
+
 
 def add_multiple_jupyterhub_buttons(
     app: Sphinx,
@@ -21,16 +123,10 @@ def add_multiple_jupyterhub_buttons(
     This function runs after the standard launch buttons are added and appends
     additional JupyterHub buttons based on the 'jupyterhub_servers' configuration.
     """
-    config_theme = app.config["html_theme_options"]
-    launch_buttons = (
-        config_theme.get("launch_buttons")
-        or getattr(app.config, "launch_buttons", None)
-        or {}
-    )
-    jupyterhub_servers = launch_buttons.get("jupyterhub_servers", [])
+    jh_ctx = getattr(app.env, "_nd_jh_ctx", None)
     
     # If there are no additional servers configured, do nothing
-    if not jupyterhub_servers:
+    if not jh_ctx or not jh_ctx["servers"]:
         return
     
     # Check if this page should have launch buttons (must be a notebook)
@@ -42,10 +138,11 @@ def add_multiple_jupyterhub_buttons(
     # Find the existing launch buttons list
     launch_buttons_list = None
     for button in header_buttons:
-        if isinstance(button, dict) and button.get("type") in ("dropdown", "group"):
-            if button.get("tooltip") and "Launch" in button.get("tooltip", ""):
-                launch_buttons_list = button.get("buttons", [])
-                break
+        if not isinstance(button, dict) or button.get("type") not in _LAUNCH_TYPES:
+            continue
+        if "Launch" in (button.get("tooltip") or ""):
+            launch_buttons_list = button.get("buttons", [])
+            break
     
     # If we don't have a launch buttons dropdown yet, check if there's a direct button list
     if launch_buttons_list is None:
@@ -63,66 +160,25 @@ def add_multiple_jupyterhub_buttons(
     if org is None and repo is None:
         return
     
-    # Get the branch from config (fall back across common config locations)
-    repo_config = getattr(app.config, "repository", None) or {}
-    branch = (
-        repo_config.get("branch")
-        or config_theme.get("repository_branch")
-        or "main"
-    )
-    
-    # Get the notebook interface preference
-    notebook_interface = launch_buttons.get("notebook_interface", "classic")
-    notebook_interface_prefixes = {"classic": "tree", "jupyterlab": "lab/tree"}
-    ui_pre = notebook_interface_prefixes.get(notebook_interface, "tree")
-    
     # Get the path to the current file
-    book_relpath = (
-        (config_theme.get("path_to_docs") or repo_config.get("path_to_book") or "")
-        .strip("/")
-    )
-    if book_relpath != "":
-        book_relpath += "/"
-    
     path = app.env.doc2path(pagename)
     extension = Path(path).suffix
     
     # Check if we have a non-ipynb file, but an ipynb of same name exists
-    if extension != ".ipynb" and Path(path).with_suffix(".ipynb").exists():
+    if extension != ".ipynb" and pagename in getattr(app.env, "_nd_ipynb_set", ()):
         extension = ".ipynb"
     
-    path_rel_repo = f"{book_relpath}{pagename}{extension}"
-    
-    # Remove the default JupyterHub button if it exists
-    original_jupyterhub_idx = None
-    for idx, button in enumerate(launch_buttons_list):
-        if isinstance(button, dict) and button.get("text") == "JupyterHub":
-            original_jupyterhub_idx = idx
-            break
+    path_rel_repo = f"{jh_ctx['book_relpath']}{pagename}{extension}"
     
-    # Remove the original button if we found it
-    if original_jupyterhub_idx is not None:
-        launch_buttons_list.pop(original_jupyterhub_idx)
-    
-    # Add each JupyterHub server as a button
-    for server in jupyterhub_servers:
-        server_url = server.get("url", "").strip("/")
-        server_text = server.get("text", "JupyterHub")
-        
-        if not server_url:
-            continue
+    # Build a button for each JupyterHub server
+    template = jh_ctx["template"]
+    repo_url_q = quote_plus(str(repo_url), safe="/")
+    path_q = quote_plus(f"{repo}/{path_rel_repo}", safe="/")
+    new_buttons = []
+    for server_url, server_text in jh_ctx["servers"]:
+        url = template.format(server=server_url, repo_url=repo_url_q, path=path_q)
         
-        url_params = urlencode(
-            dict(
-                repo=repo_url,
-                urlpath=f"{ui_pre}/{repo}/{path_rel_repo}",
-                branch=branch
-            ),
-            safe="/",
-        )
-        url = f"{server_url}/hub/user-redirect/git-pull?{url_params}"
-        
-        launch_buttons_list.append(
+        new_buttons.append(
             {
                 "type": "link",
                 "text": server_text,
@@ -131,13 +187,31 @@ def add_multiple_jupyterhub_buttons(
                 "url": url,
             }
         )
+    
+    # Replace the default JupyterHub button with ours in a single pass; the
+    # list is updated in place because the theme context still references it
+    launch_buttons_list[:] = [
+        button
+        for button in launch_buttons_list
+        if not (isinstance(button, dict) and button.get("text") == "JupyterHub")
+    ] + new_buttons
 
 
-def setup(app: Sphinx):
-    """Setup the Sphinx extension."""
+def _maybe_register(app: Sphinx, config: Config):
+    """Connect the handlers only when JupyterHub servers are configured."""
+    if not _launch_buttons_config(config).get("jupyterhub_servers"):
+        return
+    app.connect("builder-inited", _build_jupyterhub_context)
+    app.connect("builder-inited", _index_notebooks)
+    app.connect("env-purge-doc", _purge_notebook)
     # Connect to the html-page-context event with high priority to run after
     # the default launch buttons are added
     app.connect("html-page-context", add_multiple_jupyterhub_buttons, priority=1000)
+
+
+def setup(app: Sphinx):
+    """Setup the Sphinx extension."""
+    app.connect("config-inited", _maybe_register)
     
     return {
         "version": "0.1",
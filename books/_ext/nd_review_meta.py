@@ -8,16 +8,82 @@ Setup (in _config.yml):
   sphinx:
     local_extensions:
       nd_review_meta: _ext
+
+Reading the .ipynb file itself is a fallback for notebooks whose metadata
+did not reach the Sphinx environment; it is off by default and can be
+enabled with:
+  sphinx:
+    config:
+      nd_review_disable_nb_read: false
 """
 
 from __future__ import annotations
 
 import json
+import os
+import re
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, BinaryIO, Optional
 
 from docutils.nodes import document
 from sphinx.application import Sphinx
+from sphinx.util import logging
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional speed-up
+    ijson = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+logger = logging.getLogger(__name__)
+_nb_read_logged = False
+
+# nbformat writes sorted keys with indent=1, so the notebook-level
+# "metadata" object follows "cells" near the end of the file, and its own
+# keys sit at indent 2.  The tail is searched for exactly that layout
+# before falling back to a full parse.
+_PEEK_BYTES = 1 << 16
+_NB_META_MARKER = b'\n "metadata": {'
+_ND_RE = re.compile(rb'\n  "nd_review_id": *"((?:[^"\\]|\\.)*)"')
+
+# (notebook path, mtime) -> review id; cleared at the end of every build.
+_NB_CACHE: dict[tuple[str, float], Optional[str]] = {}
+
+# pagename -> (mtime, review id), persisted next to the pickled environment
+# in the doctree directory (not the published HTML output) so unchanged
+# notebooks are not re-read on the next build.  Lookups made in forked
+# workers under parallel writes (-j N) never reach the main process, so
+# the cache only fills up on serial builds.
+_DISK_CACHE_NAME = ".nd_review_cache.json"
+_DISK_CACHE: dict[str, tuple[float, Optional[str]]] = {}
+
+
+def _peek_review_id(f: BinaryIO) -> Optional[str]:
+    """Look for nd_review_id in the notebook-level metadata at the file's end.
+
+    Returns None whenever the tail does not have the expected nbformat
+    layout, so the caller can fall back to a full parse.
+    """
+    size = f.seek(0, os.SEEK_END)
+    f.seek(max(size - _PEEK_BYTES, 0))
+    tail = f.read()
+    start = tail.rfind(_NB_META_MARKER)
+    if start < 0:
+        return None
+    m = _ND_RE.search(tail, start)
+    if m is None:
+        return None
+    try:
+        rid = json.loads(b'"' + m.group(1) + b'"')
+    except ValueError:
+        return None
+    return rid or None
 
 
 def _get_review_id_from_nb_metadata(app: Sphinx, pagename: str) -> Optional[str]:
@@ -27,11 +93,36 @@ def _get_review_id_from_nb_metadata(app: Sphinx, pagename: str) -> Optional[str]
     if not nb_path.is_file():
         return None
     try:
-        with nb_path.open("r", encoding="utf-8") as f:
-            nb = json.load(f)
-        return nb.get("metadata", {}).get("nd_review_id") or None
-    except Exception:
+        mtime = nb_path.stat().st_mtime
+    except OSError:
         return None
+    key = (str(nb_path), mtime)
+    if key in _NB_CACHE:
+        return _NB_CACHE[key]
+    cached = _DISK_CACHE.get(pagename)
+    if cached is not None and cached[0] == mtime:
+        _NB_CACHE[key] = cached[1]
+        return cached[1]
+
+    rid: Optional[str] = None
+    try:
+        with nb_path.open("rb", buffering=1 << 20) as f:
+            rid = _peek_review_id(f)
+            if rid is None:
+                f.seek(0)
+                if ijson is not None:
+                    # Stream the top-level metadata key only; cell outputs
+                    # are never materialised.
+                    value = next(ijson.items(f, "metadata.nd_review_id"), None)
+                    rid = str(value) if value else None
+                else:
+                    nb = _loads(f.read())
+                    rid = nb.get("metadata", {}).get("nd_review_id") or None
+    except Exception:
+        rid = None
+    _NB_CACHE[key] = rid
+    _DISK_CACHE[pagename] = (mtime, rid)
+    return rid
 
 
 def _get_review_id_from_doctree(doctree: Optional[document]) -> Optional[str]:
@@ -90,11 +181,17 @@ def add_review_meta(
 ) -> None:
     """html-page-context event handler — inject the meta tag."""
 
+    global _nb_read_logged
+
     review_id = (
-        _get_review_id_from_doctree(doctree)
-        or _get_review_id_from_env(app, pagename)
-        or _get_review_id_from_nb_metadata(app, pagename)
+        _get_review_id_from_env(app, pagename)
+        or _get_review_id_from_doctree(doctree)
     )
+    if not review_id and not app.config.nd_review_disable_nb_read:
+        if not _nb_read_logged:
+            logger.info("nd_review_meta: reading notebook files for review ids")
+            _nb_read_logged = True
+        review_id = _get_review_id_from_nb_metadata(app, pagename)
 
     if not review_id:
         return
@@ -106,8 +203,38 @@ def add_review_meta(
     context["metatags"] = metatags + meta_html
 
 
+def _load_disk_cache(app: Sphinx) -> None:
+    """builder-inited event handler — load the persisted review-id cache."""
+    _DISK_CACHE.clear()
+    if app.config.nd_review_disable_nb_read:
+        return
+    try:
+        data = json.loads((Path(app.doctreedir) / _DISK_CACHE_NAME).read_text("utf-8"))
+        for pagename, (mtime, rid) in data.items():
+            _DISK_CACHE[pagename] = (float(mtime), str(rid) if rid else None)
+    except Exception:
+        # Missing or corrupt cache: start from scratch
+        _DISK_CACHE.clear()
+
+
+def _save_disk_cache(app: Sphinx, exception: Optional[Exception]) -> None:
+    """build-finished event handler — persist and reset the caches."""
+    try:
+        if not app.config.nd_review_disable_nb_read:
+            (Path(app.doctreedir) / _DISK_CACHE_NAME).write_text(
+                json.dumps(_DISK_CACHE), encoding="utf-8"
+            )
+    except Exception:
+        pass
+    _NB_CACHE.clear()
+    _DISK_CACHE.clear()
+
+
 def setup(app: Sphinx) -> dict[str, Any]:
+    app.add_config_value("nd_review_disable_nb_read", True, "html")
+    app.connect("builder-inited", _load_disk_cache)
     app.connect("html-page-context", add_review_meta)
+    app.connect("build-finished", _save_disk_cache)
     return {
         "version": "0.1",
         "parallel_read_safe": True,
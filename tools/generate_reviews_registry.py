@@ -32,16 +32,33 @@ from __future__ import annotations
 
 import argparse
 import datetime as dt
+import gzip
+import hashlib
 import json
+import math
 import os
+import posixpath
 import re
 import subprocess
 import sys
+import urllib.error
 import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+try:
+    import orjson
+except ImportError:  # optional speed-up; stdlib json is used otherwise
+    orjson = None
+
+try:
+    import re2 as re_fast  # linear-time matcher, immune to backtracking blowup
+except ImportError:
+    re_fast = re
+
 
 # ---------------------------------------------------------------------------
 # Constants
@@ -58,52 +75,145 @@ LABEL_TO_STATE: Dict[str, str] = {
     "review:stale": "stale",
 }
 
+# Precedence rank per state (lower wins) and per label, so state
+# resolution is a dict lookup rather than a scan of STATE_PRECEDENCE.
+_STATE_RANK: Dict[str, int] = {s: i for i, s in enumerate(STATE_PRECEDENCE)}
+_LABEL_RANK: Dict[str, int] = {lbl: _STATE_RANK[s] for lbl, s in LABEL_TO_STATE.items()}
+_RANK_TO_STATE = STATE_PRECEDENCE
+
+# Inline flags so the pattern compiles under both re and re2
+_ND_BLOCK_RE = re_fast.compile(r"(?is)<!--\s*nd-review\s*(.*?)\s*-->")
+_REVIEWER_SPLIT_RE = re.compile(r"[\s,]+")
+# One "key: value" per line, split at the first colon; lines starting with
+# "#" are comments.  [^\S\n] is whitespace other than newline, so empty
+# values never swallow the next line and CRLF bodies are handled.
+_KV_RE = re.compile(
+    r"^[^\S\n]*([^\s:#][^:\n]*?)[^\S\n]*:[^\S\n]*(.*?)[^\S\n]*$",
+    re.MULTILINE,
+)
+
+SEARCH_PER_PAGE = 100
+# The search API only exposes the first 1000 results of any query.
+SEARCH_MAX_RESULTS = 1000
+FETCH_WORKERS = 8
+
+# Responses are cached here with their ETag so unchanged results come
+# back as a cheap 304 on the next run.
+HTTP_CACHE_DIR = Path(os.environ.get("ND_HTTP_CACHE", ".nd_http_cache"))
+
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, Entry):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _loads = orjson.loads
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(
+            obj,
+            default=_json_default,
+            option=(orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE
+                    | orjson.OPT_PASSTHROUGH_DATACLASS),
+        )
+else:
+    _loads = json.loads
+
+    def _dumps(obj: Any) -> bytes:
+        text = json.dumps(obj, indent=2, ensure_ascii=False, default=_json_default)
+        return (text + "\n").encode("utf-8")
+
+
 def _utc_now_iso() -> str:
     return dt.datetime.now(dt.timezone.utc).replace(microsecond=0).isoformat()
 
 
-def _http_get_json(url: str, token: Optional[str] = None) -> Any:
+def _http_fetch(url: str, token: Optional[str], etag: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """GET `url` and return (decoded body, ETag).  Raises HTTPError on 304."""
     req = urllib.request.Request(url)
     req.add_header("Accept", "application/vnd.github+json")
+    req.add_header("Accept-Encoding", "gzip")
     req.add_header("User-Agent", "neurodeskedu-reviews-registry-generator")
     if token:
         req.add_header("Authorization", f"Bearer {token}")
+    if etag:
+        req.add_header("If-None-Match", etag)
     with urllib.request.urlopen(req, timeout=60) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+        body = resp.read()
+        if resp.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return body, resp.headers.get("ETag")
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _http_get_json(url: str, token: Optional[str] = None) -> Any:
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    body_path = HTTP_CACHE_DIR / f"{key}.json"
+    meta_path = HTTP_CACHE_DIR / f"{key}.meta"
+    etag = cached_body = None
+    try:
+        if meta_path.is_file() and body_path.is_file():
+            etag = meta_path.read_text(encoding="utf-8").strip() or None
+            cached_body = body_path.read_bytes()
+    except OSError:
+        etag = cached_body = None
+
+    try:
+        body, new_etag = _http_fetch(url, token, etag)
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or cached_body is None:
+            raise
+        try:
+            return _loads(cached_body)
+        except Exception:
+            # Corrupt cache entry: retry once without the conditional header
+            body, new_etag = _http_fetch(url, token, None)
+
+    if new_etag:
+        # Drop the old ETag before replacing the body, and write the new ETag
+        # last, so an interrupted update never pairs an ETag with a body
+        # from a different response
+        try:
+            HTTP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            meta_path.unlink(missing_ok=True)
+            _write_atomic(body_path, body)
+            _write_atomic(meta_path, new_etag.encode("utf-8"))
+        except OSError:
+            try:
+                meta_path.unlink()
+            except OSError:
+                pass
+    return _loads(body)
 
 
 def _extract_nd_review_block(body: str) -> Dict[str, str]:
     """Parse the <!-- nd-review ... --> HTML comment block."""
     if not body:
         return {}
-    m = re.search(r"<!--\s*nd-review\s*(.*?)\s*-->", body, re.DOTALL | re.IGNORECASE)
+    m = _ND_BLOCK_RE.search(body)
     if not m:
         return {}
-    out: Dict[str, str] = {}
-    for raw in m.group(1).splitlines():
-        line = raw.strip()
-        if not line or line.startswith("#") or ":" not in line:
-            continue
-        key, value = line.split(":", 1)
-        out[key.strip()] = value.strip()
-    return out
+    return dict(_KV_RE.findall(m.group(1)))
 
 
 def _infer_state(labels: List[str]) -> str:
-    mapped = set()
+    best = len(_RANK_TO_STATE)
     for label in labels:
-        s = LABEL_TO_STATE.get(label.strip().lower())
-        if s:
-            mapped.add(s)
-    for state in STATE_PRECEDENCE:
-        if state in mapped:
-            return state
-    return "unreviewed"
+        r = _LABEL_RANK.get(label.strip().lower())
+        if r is not None and r < best:
+            best = r
+    return _RANK_TO_STATE[best] if best < len(_RANK_TO_STATE) else "unreviewed"
 
 
 def _labels_from_issue(issue: Dict[str, Any]) -> List[str]:
@@ -121,7 +231,7 @@ def _reviewers_from_issue(issue: Dict[str, Any], nd: Dict[str, str]) -> List[str
     raw = nd.get("reviewers")
     if raw:
         reviewers: List[str] = []
-        for r in re.split(r"[\s,]+", raw.strip()):
+        for r in _REVIEWER_SPLIT_RE.split(raw.strip()):
             r = r.strip().lstrip("@")
             if r:
                 reviewers.append(r)
@@ -139,44 +249,61 @@ def _reviewers_from_issue(issue: Dict[str, Any], nd: Dict[str, str]) -> List[str
 # Issue -> registry entry
 # ---------------------------------------------------------------------------
 
-def _issue_to_entry(issue: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+@dataclass(slots=True)
+class Entry:
+    """A single registry entry.
+
+    Slotted to keep large registries compact; converted to a dict only
+    when serialised, with unset optional fields omitted.
+    """
+
+    state: str
+    review_issue_url: Optional[str] = None
+    doi_url: Optional[str] = None
+    reviewers: Optional[List[str]] = None
+    reviewed_at: Optional[str] = None
+    review_commit_sha: Optional[str] = None
+    source_path: Optional[str] = None
+    stale_reason: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "state": self.state,
+            "review_issue_url": self.review_issue_url,
+        }
+        for key in ("doi_url", "reviewers", "reviewed_at",
+                    "review_commit_sha", "source_path", "stale_reason"):
+            value = getattr(self, key)
+            if value is not None:
+                out[key] = value
+        return out
+
+
+def _issue_to_entry(issue: Dict[str, Any]) -> Tuple[Optional[str], Optional[Entry]]:
     """Extract a single registry entry from a GitHub issue.
 
-    Returns (review_id, entry_dict).  review_id is None if the issue
-    doesn't contain a valid nd-review block with a review_id.
+    Returns (review_id, entry).  Both are None if the issue doesn't
+    contain a valid nd-review block with a review_id.
     """
     nd = _extract_nd_review_block(issue.get("body") or "")
 
     review_id = nd.get("review_id")
     if not review_id:
-        return None, {}
+        return None, None
 
     labels = _labels_from_issue(issue)
-    state = _infer_state(labels)
     reviewers = _reviewers_from_issue(issue, nd)
 
-    entry: Dict[str, Any] = {
-        "state": state,
-        "review_issue_url": issue.get("html_url"),
-    }
-
-    # Optional fields — only include when present
-    for key in ("doi_url", "doi"):
-        if nd.get(key):
-            entry["doi_url"] = nd[key]
-            break
-    if reviewers:
-        entry["reviewers"] = reviewers
-    if nd.get("reviewed_at"):
-        entry["reviewed_at"] = nd["reviewed_at"]
-    for key in ("review_commit_sha", "review_sha"):
-        if nd.get(key):
-            entry["review_commit_sha"] = nd[key]
-            break
-    if nd.get("source_path"):
-        entry["source_path"] = nd["source_path"]
-
-    return review_id, entry
+    # Optional fields — only set when present
+    return review_id, Entry(
+        state=_infer_state(labels),
+        review_issue_url=issue.get("html_url"),
+        doi_url=nd.get("doi_url") or nd.get("doi") or None,
+        reviewers=reviewers or None,
+        reviewed_at=nd.get("reviewed_at") or None,
+        review_commit_sha=nd.get("review_commit_sha") or nd.get("review_sha") or None,
+        source_path=nd.get("source_path") or None,
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -185,14 +312,26 @@ def _issue_to_entry(issue: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any
 
 def load_issues_from_github(reviews_repo: str, token: Optional[str]) -> List[Dict[str, Any]]:
     q = f'repo:{reviews_repo} is:issue "nd-review"'
-    url = f"https://api.github.com/search/issues?q={urllib.parse.quote(q)}&per_page=100"
+    url = (f"https://api.github.com/search/issues?q={urllib.parse.quote(q)}"
+           f"&per_page={SEARCH_PER_PAGE}")
     data = _http_get_json(url, token=token)
-    return list(data.get("items") or [])
+    issues = list(data.get("items") or [])
+
+    # The first page tells us how many more to fetch; grab the rest
+    # concurrently so round-trips overlap.
+    total = min(int(data.get("total_count") or 0), SEARCH_MAX_RESULTS)
+    page_urls = [f"{url}&page={p}"
+                 for p in range(2, math.ceil(total / SEARCH_PER_PAGE) + 1)]
+    if page_urls:
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(page_urls))) as pool:
+            for page in pool.map(lambda u: _http_get_json(u, token=token), page_urls):
+                issues.extend(page.get("items") or [])
+    return issues
 
 
 def load_issues_from_fixture(path: str) -> List[Dict[str, Any]]:
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(path, "rb") as f:
+        data = _loads(f.read())
     if isinstance(data, dict) and "items" in data:
         return list(data["items"])
     if isinstance(data, list):
@@ -205,7 +344,8 @@ def load_issues_from_fixture(path: str) -> List[Dict[str, Any]]:
 # ---------------------------------------------------------------------------
 
 def build_registry(issues: List[Dict[str, Any]], reviews_repo: str) -> Dict[str, Any]:
-    entries: Dict[str, Any] = {}
+    entries: Dict[str, Entry] = {}
+    best_rank: Dict[str, int] = {}
 
     for issue in issues:
         review_id, entry = _issue_to_entry(issue)
@@ -213,14 +353,10 @@ def build_registry(issues: List[Dict[str, Any]], reviews_repo: str) -> Dict[str,
             continue
 
         # Duplicate review_id: keep entry with higher-precedence state
-        existing = entries.get(review_id)
-        if existing:
-            old_rank = STATE_PRECEDENCE.index(existing.get("state", "unreviewed"))
-            new_rank = STATE_PRECEDENCE.index(entry.get("state", "unreviewed"))
-            if new_rank < old_rank:
-                entries[review_id] = entry
-        else:
+        rank = _STATE_RANK[entry.state]
+        if review_id not in best_rank or rank < best_rank[review_id]:
             entries[review_id] = entry
+            best_rank[review_id] = rank
 
     return {
         "version": 2,
@@ -229,7 +365,8 @@ def build_registry(issues: List[Dict[str, Any]], reviews_repo: str) -> Dict[str,
             "type": "github-issues",
             "repo": reviews_repo,
         },
-        "reviews": entries,
+        # Sorted once here so the written file is diff-stable
+        "reviews": dict(sorted(entries.items())),
     }
 
 
@@ -253,24 +390,72 @@ def _git_latest_sha(repo_dir: Path, filepath: str) -> Optional[str]:
         return None
 
 
+def _git_latest_shas(repo_dir: Path, filepaths: List[str]) -> Optional[Dict[str, str]]:
+    """Return {path: SHA of the latest commit touching it} for `filepaths`
+    using a single `git log` walk.  Returns None if git fails; paths with
+    no matching commit are absent from the result.
+
+    --cc lists files for merge commits that resolved them, which plain
+    --name-only omits.  History is still simplified against the whole
+    pathspec rather than per path, so a side-branch change to one file
+    that was discarded at merge can be reported when another file from
+    that branch was kept.  Callers should treat a mismatch as a hint and
+    confirm it with _git_latest_sha."""
+    try:
+        result = subprocess.run(
+            ["git", "-c", "core.quotePath=false", "log", "--cc",
+             "--format=%x00%H", "--name-only", "--", *filepaths],
+            cwd=str(repo_dir),
+            capture_output=True,
+            text=True,
+            timeout=120,
+            check=True,
+        )
+    except Exception:
+        return None
+    wanted = set(filepaths)
+    latest: Dict[str, str] = {}
+    sha = None
+    # Commits are listed newest first, so the first SHA seen per path wins.
+    for line in result.stdout.splitlines():
+        if line.startswith("\0"):
+            sha = line[1:]
+        elif sha and line in wanted and line not in latest:
+            latest[line] = sha
+    return latest
+
+
 def apply_staleness(registry: Dict[str, Any], repo_dir: Path) -> int:
     """For every 'reviewed' entry with review_commit_sha + source_path,
     check if the file was modified after the recorded SHA.  If so, mark
     the entry as stale.  Returns the number of entries marked stale."""
-    stale_count = 0
+    candidates = []
     for review_id, entry in registry.get("reviews", {}).items():
-        if entry.get("state") != "reviewed":
+        if entry.state != "reviewed":
             continue
-        recorded_sha = entry.get("review_commit_sha")
-        source_path = entry.get("source_path")
+        recorded_sha = entry.review_commit_sha
+        source_path = entry.source_path
         if not recorded_sha or not source_path:
             continue
-        # source_path is relative to books/; git log needs repo-root-relative path
-        git_path = f"books/{source_path}"
-        latest_sha = _git_latest_sha(repo_dir, git_path)
+        # source_path is relative to books/; git log needs repo-root-relative
+        # path, normalised so it matches the paths git prints
+        git_path = posixpath.normpath(f"books/{source_path}")
+        candidates.append((entry, recorded_sha, git_path))
+    if not candidates:
+        return 0
+
+    latest_shas = _git_latest_shas(repo_dir, sorted({c[2] for c in candidates}))
+
+    stale_count = 0
+    for entry, recorded_sha, git_path in candidates:
+        latest_sha = (latest_shas or {}).get(git_path)
+        if latest_sha != recorded_sha:
+            # Batch walk failed, missed this path or disagrees with the
+            # review; confirm with the exact per-file lookup
+            latest_sha = _git_latest_sha(repo_dir, git_path)
         if latest_sha and latest_sha != recorded_sha:
-            entry["state"] = "stale"
-            entry["stale_reason"] = (
+            entry.state = "stale"
+            entry.stale_reason = (
                 f"File modified after review (latest: {latest_sha[:12]}, "
                 f"reviewed at: {recorded_sha[:12]})"
             )
@@ -309,9 +494,8 @@ def main(argv: List[str]) -> int:
         stale_count = apply_staleness(registry, Path(repo_dir))
 
     os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(registry, f, indent=2, sort_keys=False)
-        f.write("\n")
+    # Atomic so readers never see a partial file
+    _write_atomic(Path(args.out), _dumps(registry))
 
     msg = f"Wrote {args.out} — {len(registry['reviews'])} review(s)"
     if stale_count: